@@ -1,19 +1,51 @@
 import os
 import logging
-from flask import Flask
+import decimal
+import orjson
+from flask import Flask, g
+from flask.json.provider import JSONProvider
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_bcrypt import Bcrypt
-from markupsafe import Markup
+from markupsafe import Markup, escape
 from werkzeug.middleware.proxy_fix import ProxyFix
 from sqlalchemy.orm import DeclarativeBase
 
-# Configure logging for debugging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging; set LOG_LEVEL=DEBUG for verbose output
+logging.basicConfig(
+    level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s %(message)s"
+)
+logger = logging.getLogger(__name__)
 
 class Base(DeclarativeBase):
     pass
 
+def _orjson_default(obj):
+    """Serialize the types Flask's default provider supports but orjson does not"""
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+# Like the stdlib provider, accept int/float/bool dict keys by converting them to strings
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider backed by orjson, used by jsonify and request.get_json"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_orjson_default, option=_ORJSON_OPTIONS).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response, skipping a decode/encode round trip
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=_orjson_default, option=_ORJSON_OPTIONS), mimetype='application/json')
+
 # Create extensions
 db = SQLAlchemy(model_class=Base)
 login_manager = LoginManager()
@@ -22,6 +54,7 @@ bcrypt = Bcrypt()
 # Create the Flask app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "civil-ai-default-secret-key")
+app.json = OrjsonProvider(app)
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
 # Database configuration
@@ -54,6 +87,17 @@ if database_url.startswith("postgresql://") or database_url.startswith("postgres
     app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
         "pool_recycle": 300,
         "pool_pre_ping": True,
+        # Room for concurrent chat sessions without queueing on a connection
+        "pool_size": 20,
+        "max_overflow": 40,
+        "pool_timeout": 10,
+        # TCP keepalives stop idle cloud connections from going stale between requests
+        "connect_args": {
+            "keepalives": 1,
+            "keepalives_idle": 30,
+            "keepalives_interval": 10,
+            "keepalives_count": 5,
+        },
     }
 
 # Initialize extensions
@@ -67,27 +111,60 @@ login_manager.login_message = 'Please log in to access CivilBot.'
 login_manager.login_message_category = 'info'
 
 # Add custom template filter for newline to br conversion
-@app.template_filter('nl2br')
+_NL_BR = Markup('<br>\n')
+
 def nl2br_filter(text):
-    """Convert newlines to HTML line breaks"""
+    """Escape text and convert newlines to HTML line breaks"""
     if text is None:
         return ''
-    return Markup(str(text).replace('\n', '<br>\n'))
+    return _NL_BR.join(escape(text).split('\n'))
+
+app.add_template_filter(nl2br_filter, 'nl2br')
 
 # User loader function
 @login_manager.user_loader
 def load_user(user_id):
     from models import User
-    return User.query.get(int(user_id))
+    uid = int(user_id)
+    
+    # Reuse the user already loaded during this request
+    user = g.get('user')
+    if user is not None and user.id == uid:
+        return user
+    
+    # Session.get checks the identity map before querying the database
+    user = db.session.get(User, uid)
+    g.user = user
+    return user
 
-# Create database tables
-with app.app_context():
-    from models import User, ChatHistory, ProjectSchedule, GeneratedImage
+# Create database tables (one-time setup, kept off the worker start-up path)
+def init_db():
+    """Create any missing database tables"""
+    from models import User, ChatHistory, ChatSummary, ProjectSchedule, GeneratedImage
     db.create_all()
-    logging.info("Database tables created")
+    logger.info("Database tables created")
+
+@app.cli.command("init-db")
+def init_db_command():
+    """Create the database tables: flask --app main init-db"""
+    init_db()
+
+@app.cli.command("generate-safety-checklist")
+def generate_safety_checklist_command():
+    """Save the safety checklist to static/ so uploads skip Groq: flask --app main generate-safety-checklist"""
+    from civil_ai import TEMPLATE_DIR, get_civil_ai
+    path = TEMPLATE_DIR / "safety_checklist.md"
+    path.write_text(get_civil_ai()._fetch_safety_template(), encoding="utf-8")
+    logger.info("Safety checklist written to %s", path)
+
+@app.cli.command("prune-chat-history")
+def prune_chat_history_command():
+    """Trim every user's chat history to the newest exchanges, e.g. from cron: flask --app main prune-chat-history"""
+    from routes import prune_chat_history
+    logger.info("Deleted %s old chat exchanges", prune_chat_history())
 
 # Import routes after app creation to avoid circular imports
 from routes import *
 
 # Log startup information
-logging.info("ConstructIQ Assistant application started successfully")
+logger.info("ConstructIQ Assistant application started successfully")
@@ -1,6 +1,100 @@
 import math
 import logging
-from datetime import datetime, timedelta
+from datetime import date
+from itertools import accumulate
+from calculators_pythran import estimate_many
+
+logger = logging.getLogger(__name__)
+
+# Output precision for each beam design result, in result order
+_BEAM_ROUND = (
+    ('beam_width', 0),
+    ('beam_depth', 0),
+    ('effective_depth', 0),
+    ('moment', 2),
+    ('steel_area_required', 0),
+    ('steel_area_provided', 0),
+    ('concrete_volume', 3),
+    ('steel_weight', 2)
+)
+
+# Output precision for each material estimate, as (section, ((key, column, precision), ...))
+_QUANTITY_ROUND = (
+    ('dimensions', (
+        ('floor_area', 'floor_area', 2),
+        ('wall_area', 'wall_area', 2)
+    )),
+    ('concrete', (
+        ('volume', 'concrete_volume', 3),
+        ('cement_bags', 'cement_bags', 1),
+        ('sand_volume', 'sand_volume', 2),
+        ('aggregate_volume', 'aggregate_volume', 2),
+        ('steel_weight', 'steel_weight', 2)
+    )),
+    ('brickwork', (
+        ('brick_volume', 'brick_volume', 3),
+        ('bricks_required', 'bricks_required', 0),
+        ('mortar_volume', 'mortar_volume', 3)
+    )),
+    ('costs', tuple((name, name, 2) for name in (
+        'cement_cost', 'sand_cost', 'aggregate_cost', 'steel_cost', 'brick_cost',
+        'total_material_cost', 'labor_cost', 'total_cost'
+    )))
+)
+
+# Area of a 16mm main bar (mm²)
+BAR16_AREA = math.pi * 256.0 / 4.0
+# Minimum steel as a fraction of gross area (0.85% as per IS 456)
+MIN_STEEL_COEFF = 0.0085
+# Reciprocal of the lever-arm factors in Ast = M / (0.87 * fy * 0.9 * d)
+INV_STEEL_DENOM_K = 1.0 / (0.87 * 0.9)
+
+def _round_dict(table, values):
+    """Round values against a (key, precision) table and return them as a dict"""
+    return {key: round(value, digits) for (key, digits), value in zip(table, values)}
+
+def _beam_core(span, load, fy, steel_density):
+    """Numeric core of the beam design using only floats, for reuse in design sweeps
+    
+    Returns (width, overall_depth, effective_depth, moment, ast_required,
+    actual_steel, num_bars, concrete_volume, steel_weight).
+    """
+    # Convert span from meters to mm
+    span_mm = span * 1000
+    
+    # Calculate maximum bending moment (kN-m for simply supported beam with UDL)
+    moment = (load * span**2) / 8  # kN-m
+    moment_nmm = moment * 1000000  # Convert to N-mm
+    
+    # Estimate beam depth (span/10 to span/12 rule of thumb)
+    effective_depth = span_mm / 10
+    overall_depth = effective_depth + 50  # Assuming 50mm cover + bar dia
+    
+    # Assume width as depth/2 (typical ratio)
+    width = overall_depth / 2
+    
+    # Calculate required steel area
+    # Using simplified formula: Ast = M / (0.87 * fy * 0.9 * d)
+    ast_required = moment_nmm * INV_STEEL_DENOM_K / (fy * effective_depth)
+    
+    # Minimum steel (0.85% of gross area as per IS 456)
+    min_steel = MIN_STEEL_COEFF * width * overall_depth
+    ast_required = ast_required if ast_required > min_steel else min_steel
+    
+    # Calculate number of bars (assuming 16mm dia bars)
+    num_bars = math.ceil(ast_required / BAR16_AREA)
+    actual_steel = num_bars * BAR16_AREA
+    
+    # Calculate concrete volume
+    concrete_volume = (width * overall_depth * span_mm) / 1000000000  # m³
+    
+    # Steel weight
+    steel_length = span * num_bars  # Main bars length
+    steel_volume = (actual_steel * steel_length) / 1000000  # m³
+    steel_weight = steel_volume * steel_density  # kg
+    
+    return (width, overall_depth, effective_depth, moment, ast_required,
+            actual_steel, num_bars, concrete_volume, steel_weight)
 
 class StructuralCalculator:
     """Calculator for structural design calculations"""
@@ -25,155 +119,63 @@ class StructuralCalculator:
         """Calculate beam dimensions and reinforcement"""
         try:
             # Get material properties
+            steel = self.steel_grades[steel_grade]
             fck = self.concrete_grades[concrete_grade]['fck']  # N/mm²
-            fy = self.steel_grades[steel_grade]['fy']  # N/mm²
-            
-            # Convert span from meters to mm
-            span_mm = span * 1000
-            
-            # Calculate maximum bending moment (kN-m for simply supported beam with UDL)
-            moment = (load * span**2) / 8  # kN-m
-            moment_nmm = moment * 1000000  # Convert to N-mm
-            
-            # Estimate beam depth (span/10 to span/12 rule of thumb)
-            effective_depth = span_mm / 10
-            overall_depth = effective_depth + 50  # Assuming 50mm cover + bar dia
+            fy = steel['fy']  # N/mm²
+            steel_density = steel['density']  # kg/m³
             
-            # Assume width as depth/2 (typical ratio)
-            width = overall_depth / 2
+            (width, overall_depth, effective_depth, moment, ast_required,
+             actual_steel, num_bars, concrete_volume, steel_weight) = _beam_core(span, load, fy, steel_density)
             
-            # Calculate required steel area
-            # Using simplified formula: Ast = M / (0.87 * fy * 0.9 * d)
-            ast_required = moment_nmm / (0.87 * fy * 0.9 * effective_depth)
-            
-            # Minimum steel (0.85% of gross area as per IS 456)
-            min_steel = (0.85 / 100) * width * overall_depth
-            ast_required = max(ast_required, min_steel)
-            
-            # Calculate number of bars (assuming 16mm dia bars)
-            bar_area = math.pi * (16**2) / 4  # Area of 16mm bar
-            num_bars = math.ceil(ast_required / bar_area)
-            actual_steel = num_bars * bar_area
-            
-            # Calculate concrete volume
-            concrete_volume = (width * overall_depth * span_mm) / 1000000000  # m³
-            
-            # Steel weight
-            steel_density = self.steel_grades[steel_grade]['density']  # kg/m³
-            steel_length = span * num_bars  # Main bars length
-            steel_volume = (actual_steel * steel_length) / 1000000  # m³
-            steel_weight = steel_volume * steel_density  # kg
-            
-            return {
-                'beam_width': round(width, 0),
-                'beam_depth': round(overall_depth, 0),
-                'effective_depth': round(effective_depth, 0),
-                'moment': round(moment, 2),
-                'steel_area_required': round(ast_required, 0),
-                'steel_area_provided': round(actual_steel, 0),
-                'num_bars': num_bars,
-                'concrete_volume': round(concrete_volume, 3),
-                'steel_weight': round(steel_weight, 2),
-                'fck': fck,
-                'fy': fy
-            }
+            results = _round_dict(_BEAM_ROUND, (
+                width, overall_depth, effective_depth, moment,
+                ast_required, actual_steel, concrete_volume, steel_weight
+            ))
+            results['num_bars'] = num_bars
+            results['fck'] = fck
+            results['fy'] = fy
+            return results
             
         except Exception as e:
-            logging.error(f"Beam calculation error: {str(e)}")
+            logger.exception("Beam calculation error: %s", e)
             raise Exception(f"Calculation failed: {str(e)}")
 
 class MaterialEstimator:
     """Calculator for material quantity and cost estimation"""
     
-    def calculate_quantities(self, length, width, height, cement_rate, sand_rate, aggregate_rate, steel_rate):
-        """Calculate material quantities for a room/building"""
+    # Columns returned by calculate_quantities_batch, in calculators_pythran.room_quantities order
+    QUANTITY_COLUMNS = (
+        'floor_area', 'wall_area',
+        'concrete_volume', 'cement_bags', 'sand_volume', 'aggregate_volume', 'steel_weight',
+        'brick_volume', 'bricks_required', 'mortar_volume',
+        'cement_cost', 'sand_cost', 'aggregate_cost', 'steel_cost', 'brick_cost',
+        'total_material_cost', 'labor_cost', 'total_cost'
+    )
+    
+    def calculate_quantities_batch(self, lengths, widths, heights, cement_rate, sand_rate, aggregate_rate, steel_rate):
+        """Calculate unrounded quantities for many rooms, returned as one list per column"""
         try:
-            # Room/building parameters
-            floor_area = length * width  # m²
-            wall_area = 2 * (length + width) * height  # m² (assuming standard walls)
-            
-            # Concrete volume calculations (assuming RCC structure)
-            slab_thickness = 0.15  # 150mm slab
-            beam_volume = floor_area * 0.03  # Approximate beam volume
-            column_volume = floor_area * 0.02  # Approximate column volume
-            footing_volume = floor_area * 0.05  # Approximate footing volume
-            
-            total_concrete_volume = floor_area * slab_thickness + beam_volume + column_volume + footing_volume
-            
-            # Material quantities per m³ of concrete (standard mix ratios)
-            # For M25 grade concrete (1:1:2)
-            cement_bags_per_m3 = 8.5  # bags of 50kg each
-            sand_per_m3 = 0.45  # m³
-            aggregate_per_m3 = 0.9  # m³
-            steel_per_m3 = 80  # kg (typical for residential buildings)
-            
-            # Total material quantities
-            cement_bags = total_concrete_volume * cement_bags_per_m3
-            sand_volume = total_concrete_volume * sand_per_m3
-            aggregate_volume = total_concrete_volume * aggregate_per_m3
-            steel_weight = total_concrete_volume * steel_per_m3
-            
-            # Brick work for walls (assuming 230mm thick brick walls)
-            brick_volume = wall_area * 0.23  # m³
-            bricks_required = brick_volume * 500  # 500 bricks per m³
-            mortar_volume = brick_volume * 0.3  # 30% mortar
-            
-            # Additional cement and sand for brick work
-            cement_bags_brickwork = mortar_volume * 5.5  # bags
-            sand_brickwork = mortar_volume * 1.0  # m³
-            
-            # Total quantities
-            total_cement_bags = cement_bags + cement_bags_brickwork
-            total_sand_volume = sand_volume + sand_brickwork
-            
-            # Cost calculations
-            cement_cost = total_cement_bags * cement_rate
-            sand_cost = total_sand_volume * sand_rate
-            aggregate_cost = aggregate_volume * aggregate_rate
-            steel_cost = steel_weight * steel_rate
-            brick_cost = bricks_required * 8  # ₹8 per brick
-            
-            total_material_cost = cement_cost + sand_cost + aggregate_cost + steel_cost + brick_cost
-            
-            # Add labor cost (approximately 40% of material cost)
-            labor_cost = total_material_cost * 0.4
-            total_cost = total_material_cost + labor_cost
-            
-            return {
-                'dimensions': {
-                    'length': length,
-                    'width': width,
-                    'height': height,
-                    'floor_area': round(floor_area, 2),
-                    'wall_area': round(wall_area, 2)
-                },
-                'concrete': {
-                    'volume': round(total_concrete_volume, 3),
-                    'cement_bags': round(total_cement_bags, 1),
-                    'sand_volume': round(total_sand_volume, 2),
-                    'aggregate_volume': round(aggregate_volume, 2),
-                    'steel_weight': round(steel_weight, 2)
-                },
-                'brickwork': {
-                    'brick_volume': round(brick_volume, 3),
-                    'bricks_required': round(bricks_required, 0),
-                    'mortar_volume': round(mortar_volume, 3)
-                },
-                'costs': {
-                    'cement_cost': round(cement_cost, 2),
-                    'sand_cost': round(sand_cost, 2),
-                    'aggregate_cost': round(aggregate_cost, 2),
-                    'steel_cost': round(steel_cost, 2),
-                    'brick_cost': round(brick_cost, 2),
-                    'total_material_cost': round(total_material_cost, 2),
-                    'labor_cost': round(labor_cost, 2),
-                    'total_cost': round(total_cost, 2)
-                }
-            }
+            columns = estimate_many(
+                [float(x) for x in lengths], [float(x) for x in widths], [float(x) for x in heights],
+                float(cement_rate), float(sand_rate), float(aggregate_rate), float(steel_rate)
+            )
+            return dict(zip(self.QUANTITY_COLUMNS, columns))
             
         except Exception as e:
-            logging.error(f"Material estimation error: {str(e)}")
+            logger.exception("Material estimation error: %s", e)
             raise Exception(f"Estimation failed: {str(e)}")
+    
+    def calculate_quantities(self, length, width, height, cement_rate, sand_rate, aggregate_rate, steel_rate):
+        """Calculate material quantities for a room/building"""
+        batch = self.calculate_quantities_batch([length], [width], [height], cement_rate, sand_rate, aggregate_rate, steel_rate)
+        q = {name: column[0] for name, column in batch.items()}
+        
+        results = {
+            section: {key: round(q[column], digits) for key, column, digits in fields}
+            for section, fields in _QUANTITY_ROUND
+        }
+        results['dimensions'] = {'length': length, 'width': width, 'height': height, **results['dimensions']}
+        return results
 
 class ProjectScheduler:
     """Simple project scheduler with Gantt chart generation"""
@@ -181,41 +183,34 @@ class ProjectScheduler:
     def create_schedule(self, tasks_data):
         """Create a project schedule from task data"""
         try:
-            # Start date (today)
-            start_date = datetime.now()
-            
-            schedule = []
-            current_date = start_date
-            
-            for i, task in enumerate(tasks_data):
-                task_start = current_date
-                task_end = current_date + timedelta(days=task['duration'] - 1)
-                
-                schedule.append({
-                    'id': i + 1,
-                    'name': task['name'],
-                    'duration': task['duration'],
-                    'start_date': task_start.strftime('%Y-%m-%d'),
-                    'end_date': task_end.strftime('%Y-%m-%d'),
-                    'start_day': (task_start - start_date).days + 1,
-                    'width': task['duration'] * 20  # Width for visualization
-                })
-                
-                # Next task starts after current task ends
-                current_date = task_end + timedelta(days=1)
+            # Start date (today), as a day ordinal so task dates are plain integer offsets
+            base = date.today().toordinal()
+            
+            # Tasks run back to back, so each task ends at the running total of durations
+            durations = [task['duration'] for task in tasks_data]
+            ends = list(accumulate(durations))
+            
+            schedule = [{
+                'id': i + 1,
+                'name': task['name'],
+                'duration': duration,
+                'start_date': date.fromordinal(base + end - duration).isoformat(),
+                'end_date': date.fromordinal(base + end - 1).isoformat(),
+                'start_day': end - duration + 1,
+                'width': duration * 20  # Width for visualization
+            } for i, (task, duration, end) in enumerate(zip(tasks_data, durations, ends))]
             
             # Project summary
-            total_duration = (current_date - start_date).days
-            project_end = (current_date - timedelta(days=1)).strftime('%Y-%m-%d')
+            total_duration = ends[-1] if ends else 0
             
             return {
                 'tasks': schedule,
-                'project_start': start_date.strftime('%Y-%m-%d'),
-                'project_end': project_end,
+                'project_start': date.fromordinal(base).isoformat(),
+                'project_end': date.fromordinal(base + total_duration - 1).isoformat(),
                 'total_duration': total_duration,
                 'total_tasks': len(schedule)
             }
             
         except Exception as e:
-            logging.error(f"Scheduling error: {str(e)}")
+            logger.exception("Scheduling error: %s", e)
             raise Exception(f"Scheduling failed: {str(e)}")
@@ -0,0 +1,96 @@
+"""Material estimation and steel weight kernels kept within the Pythran subset
+
+This module runs as plain Python. To build a native version for large
+estimation sweeps, compile it in place:
+
+    pythran -O3 -march=native calculators_pythran.py
+
+The compiled extension takes import precedence over this file, so
+calculators.py and routes.py pick it up without any code change.
+"""
+
+#pythran export room_quantities(float, float, float, float, float, float, float)
+def room_quantities(length, width, height, cement_rate, sand_rate, aggregate_rate, steel_rate):
+    """Unrounded quantities and costs for one room, in MaterialEstimator.QUANTITY_COLUMNS order"""
+    # Room/building parameters
+    floor_area = length * width  # m²
+    wall_area = 2 * (length + width) * height  # m² (assuming standard walls)
+
+    # Concrete volume calculations (assuming RCC structure)
+    slab_thickness = 0.15  # 150mm slab
+    beam_volume = floor_area * 0.03  # Approximate beam volume
+    column_volume = floor_area * 0.02  # Approximate column volume
+    footing_volume = floor_area * 0.05  # Approximate footing volume
+
+    total_concrete_volume = floor_area * slab_thickness + beam_volume + column_volume + footing_volume
+
+    # Material quantities per m³ of concrete (standard mix ratios)
+    # For M25 grade concrete (1:1:2)
+    cement_bags_per_m3 = 8.5  # bags of 50kg each
+    sand_per_m3 = 0.45  # m³
+    aggregate_per_m3 = 0.9  # m³
+    steel_per_m3 = 80  # kg (typical for residential buildings)
+
+    # Total material quantities
+    cement_bags = total_concrete_volume * cement_bags_per_m3
+    sand_volume = total_concrete_volume * sand_per_m3
+    aggregate_volume = total_concrete_volume * aggregate_per_m3
+    steel_weight = total_concrete_volume * steel_per_m3
+
+    # Brick work for walls (assuming 230mm thick brick walls)
+    brick_volume = wall_area * 0.23  # m³
+    bricks_required = brick_volume * 500  # 500 bricks per m³
+    mortar_volume = brick_volume * 0.3  # 30% mortar
+
+    # Additional cement and sand for brick work
+    cement_bags_brickwork = mortar_volume * 5.5  # bags
+    sand_brickwork = mortar_volume * 1.0  # m³
+
+    # Total quantities
+    total_cement_bags = cement_bags + cement_bags_brickwork
+    total_sand_volume = sand_volume + sand_brickwork
+
+    # Cost calculations
+    cement_cost = total_cement_bags * cement_rate
+    sand_cost = total_sand_volume * sand_rate
+    aggregate_cost = aggregate_volume * aggregate_rate
+    steel_cost = steel_weight * steel_rate
+    brick_cost = bricks_required * 8  # ₹8 per brick
+
+    total_material_cost = cement_cost + sand_cost + aggregate_cost + steel_cost + brick_cost
+
+    # Add labor cost (approximately 40% of material cost)
+    labor_cost = total_material_cost * 0.4
+    total_cost = total_material_cost + labor_cost
+
+    return (
+        floor_area, wall_area,
+        total_concrete_volume, total_cement_bags, total_sand_volume, aggregate_volume, steel_weight,
+        brick_volume, bricks_required, mortar_volume,
+        cement_cost, sand_cost, aggregate_cost, steel_cost, brick_cost,
+        total_material_cost, labor_cost, total_cost
+    )
+
+#pythran export estimate_many(float list, float list, float list, float, float, float, float)
+def estimate_many(lengths, widths, heights, cement_rate, sand_rate, aggregate_rate, steel_rate):
+    """Single pass over all rooms, returning one list per quantity column"""
+    n = min(len(lengths), len(widths), len(heights))
+    columns = [[0.0] * n for _ in range(18)]
+    for i in range(n):
+        row = room_quantities(lengths[i], widths[i], heights[i], cement_rate, sand_rate, aggregate_rate, steel_rate)
+        for j in range(18):
+            columns[j][i] = row[j]
+    return columns
+
+#pythran export bar_weights(float list, float list, int list, float)
+def bar_weights(diameters, lengths, quantities, length_scale):
+    """Steel weight per bar and per row in kg, from diameters in mm and lengths scaled to meters"""
+    n = min(len(diameters), len(lengths), len(quantities))
+    weights = [0.0] * n
+    totals = [0.0] * n
+    for i in range(n):
+        # Weight formula: Weight (kg) = (D²/162) × L
+        weight = (diameters[i] * diameters[i] / 162) * (lengths[i] * length_scale)
+        weights[i] = weight
+        totals[i] = weight * quantities[i]
+    return weights, totals
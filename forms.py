@@ -3,6 +3,23 @@ from wtforms import StringField, PasswordField, SubmitField, TextAreaField, Sele
 from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError
 from models import User
 
+# Select choices shared by every form instance
+CONVERSION_TYPE_CHOICES = (
+    ('length', 'Length (Meters ↔ Feet)'),
+    ('weight', 'Weight (Kg ↔ Tons)'),
+    ('area', 'Area (Sq.m ↔ Sq.ft)'),
+    ('volume', 'Volume (Cu.m ↔ Cu.ft)'),
+    ('pressure', 'Pressure (N/mm² ↔ PSI)')
+)
+
+CONSTRUCTION_TYPE_CHOICES = (
+    ('brick_wall', 'Brick Wall (9 inch)'),
+    ('concrete_slab', 'RCC Slab (6 inch)'),
+    ('plaster', 'Plastering'),
+    ('flooring', 'Flooring'),
+    ('foundation', 'Foundation')
+)
+
 class RegistrationForm(FlaskForm):
     """User registration form"""
     username = StringField('Username', validators=[
@@ -21,13 +38,12 @@ class RegistrationForm(FlaskForm):
     submit = SubmitField('Register')
     
     def validate_username(self, username):
-        user = User.query.filter_by(username=username.data).first()
-        if user:
+        # Only existence matters, so fetch the id rather than a full User row
+        if User.query.with_entities(User.id).filter_by(username=username.data).first():
             raise ValidationError('Username already exists. Please choose a different one.')
     
     def validate_email(self, email):
-        user = User.query.filter_by(email=email.data).first()
-        if user:
+        if User.query.with_entities(User.id).filter_by(email=email.data).first():
             raise ValidationError('Email already registered. Please use a different email.')
 
 class LoginForm(FlaskForm):
@@ -38,13 +54,7 @@ class LoginForm(FlaskForm):
 
 class UnitConverterForm(FlaskForm):
     """Unit converter form"""
-    conversion_type = SelectField('Conversion Type', choices=[
-        ('length', 'Length (Meters ↔ Feet)'),
-        ('weight', 'Weight (Kg ↔ Tons)'),
-        ('area', 'Area (Sq.m ↔ Sq.ft)'),
-        ('volume', 'Volume (Cu.m ↔ Cu.ft)'),
-        ('pressure', 'Pressure (N/mm² ↔ PSI)')
-    ], validators=[DataRequired()])
+    conversion_type = SelectField('Conversion Type', choices=CONVERSION_TYPE_CHOICES, validators=[DataRequired()])
     value = FloatField('Value', validators=[DataRequired()])
     from_unit = SelectField('From Unit', choices=[], validators=[DataRequired()])
     to_unit = SelectField('To Unit', choices=[], validators=[DataRequired()])
@@ -53,11 +63,5 @@ class UnitConverterForm(FlaskForm):
 class MaterialEstimatorForm(FlaskForm):
     """Material estimator form"""
     area = FloatField('Area (sq.m)', validators=[DataRequired()])
-    construction_type = SelectField('Construction Type', choices=[
-        ('brick_wall', 'Brick Wall (9 inch)'),
-        ('concrete_slab', 'RCC Slab (6 inch)'),
-        ('plaster', 'Plastering'),
-        ('flooring', 'Flooring'),
-        ('foundation', 'Foundation')
-    ], validators=[DataRequired()])
+    construction_type = SelectField('Construction Type', choices=CONSTRUCTION_TYPE_CHOICES, validators=[DataRequired()])
     submit = SubmitField('Estimate Materials')
\ No newline at end of file
@@ -0,0 +1,40 @@
+import os
+
+# Groq calls spend nearly all their time waiting on the network, so each
+# worker multiplexes many requests on gevent greenlets instead of threads
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 4))
+worker_class = "gevent"
+worker_connections = int(os.environ.get("WORKER_CONNECTIONS", 1000))
+# Streamed chat responses can stay open for the length of a Groq generation
+timeout = 120
+
+def _gevent_wait_callback(conn, timeout=None):
+    """Let psycopg2 yield to other greenlets while it waits on the database socket"""
+    from gevent.socket import wait_read, wait_write
+    from psycopg2 import extensions, OperationalError
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise OperationalError(f"Bad result from poll: {state!r}")
+
+def post_fork(server, worker):
+    """Make the database driver cooperative; the gevent worker has already patched the stdlib"""
+    try:
+        from psycopg2 import extensions
+    except ImportError:
+        return
+    extensions.set_wait_callback(_gevent_wait_callback)
+
+def post_worker_init(worker):
+    """Warm the AI client in the background once the worker has loaded the app"""
+    import threading
+    from civil_ai import warm_up
+    threading.Thread(target=warm_up, daemon=True).start()
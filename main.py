@@ -1,6 +1,9 @@
 import os
-from app import app
+from app import app, init_db
 
 if __name__ == '__main__':
+    # The development server creates missing tables itself; production runs `flask --app main init-db` once
+    with app.app_context():
+        init_db()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
@@ -16,6 +16,9 @@ class User(UserMixin, db.Model):
     # Relationship with chat history
     chat_histories = db.relationship('ChatHistory', backref='user', lazy=True, cascade='all, delete-orphan')
     
+    # Rolling summary of older chat exchanges
+    chat_summary = db.relationship('ChatSummary', uselist=False, lazy=True, cascade='all, delete-orphan')
+    
     # Relationship with project schedules
     project_schedules = db.relationship('ProjectSchedule', backref='user', lazy=True, cascade='all, delete-orphan')
     
@@ -36,6 +39,8 @@ class User(UserMixin, db.Model):
 class ChatHistory(db.Model):
     """Chat history model to store user conversations"""
     __tablename__ = 'chat_history'
+    # Serves the per-user keyset pagination and recent-history lookups
+    __table_args__ = (db.Index('ix_chat_history_user_id_id', 'user_id', 'id'),)
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -46,6 +51,18 @@ class ChatHistory(db.Model):
     def __repr__(self):
         return f'<ChatHistory {self.id} - User {self.user_id}>'
 
+class ChatSummary(db.Model):
+    """Rolling summary of a user's older chat exchanges, used as context for new messages"""
+    __tablename__ = 'chat_summaries'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    summary = db.Column(db.Text, nullable=False)
+    last_chat_id = db.Column(db.Integer, nullable=False)  # Newest ChatHistory id folded into the summary
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ChatSummary User {self.user_id}>'
+
 class ProjectSchedule(db.Model):
     """Project schedule model to store user project schedules"""
     __tablename__ = 'project_schedules'
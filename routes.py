@@ -1,30 +1,219 @@
 import os
+import math
+import time
 import logging
-from flask import render_template, request, jsonify, session, flash, redirect, url_for
+import functools
+import threading
+import orjson
+from flask import render_template, stream_template, request, jsonify, session, flash, get_flashed_messages, redirect, url_for, Response, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.utils import secure_filename
-import base64
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import raiseload, selectinload
 from app import app, db
-from civil_ai import CivilAI
+from civil_ai import get_civil_ai, submit_ai_call, submit_background_task, query_too_long
 from calculators import StructuralCalculator, MaterialEstimator, ProjectScheduler
-from models import User, ChatHistory, ProjectSchedule, GeneratedImage
-import json
+from calculators_pythran import bar_weights
+from models import User, ChatHistory, ChatSummary, ProjectSchedule, GeneratedImage
 from forms import LoginForm, RegistrationForm, UnitConverterForm, MaterialEstimatorForm
 
-# Initialize the AI assistant
-civil_ai = CivilAI()
+logger = logging.getLogger(__name__)
+
+# Initialize the calculators (the AI assistant is shared via get_civil_ai)
 structural_calc = StructuralCalculator()
 material_estimator = MaterialEstimator()
 project_scheduler = ProjectScheduler()
 
+# Calculator results are pure functions of the form inputs, and users often resubmit
+# a form after tweaking one field. The results are only read by the templates, so
+# sharing the cached dicts is safe.
+@functools.lru_cache(maxsize=4096)
+def beam_design(span, load, concrete_grade, steel_grade):
+    """Memoized structural_calc.calculate_beam_design"""
+    return structural_calc.calculate_beam_design(span, load, concrete_grade, steel_grade)
+
+@functools.lru_cache(maxsize=4096)
+def material_quantities(length, width, height, cement_rate, sand_rate, aggregate_rate, steel_rate):
+    """Memoized material_estimator.calculate_quantities"""
+    return material_estimator.calculate_quantities(length, width, height, cement_rate, sand_rate, aggregate_rate, steel_rate)
+
 # Configure upload settings
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# Dotted suffixes for str.endswith, which checks them all in one C-level call
+_ALLOWED_SUFFIXES = tuple(f'.{ext}' for ext in ALLOWED_EXTENSIONS)
+
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return filename.lower().endswith(_ALLOWED_SUFFIXES)
+
+# Leading bytes of the accepted image formats
+_IMAGE_SIGNATURES = (b'\x89PNG\r\n\x1a\n', b'\xff\xd8\xff', b'GIF87a', b'GIF89a', b'BM')
+
+def upload_starts_with(file, signatures):
+    """Check an upload's leading bytes against known file signatures without reading the rest"""
+    head = file.stream.read(12)
+    file.stream.seek(0)
+    return head.startswith(signatures)
+
+# Rendered HTML of input-free pages, reused for anonymous visitors
+PAGE_CACHE_TTL = 3600  # seconds
+_page_cache = {}
+
+def render_static_page(template):
+    """render_template for pages without inputs, served from memory to anonymous visitors"""
+    # The layout shows the logged-in user and flashed messages, so only the bare page is shared
+    if current_user.is_authenticated or '_flashes' in session:
+        return render_template(template)
+    
+    now = time.monotonic()
+    cached = _page_cache.get(template)
+    if cached and cached[1] > now:
+        return cached[0]
+    
+    html = render_template(template)
+    _page_cache[template] = (html, now + PAGE_CACHE_TTL)
+    return html
+
+def sse_response(tokens, on_complete=None):
+    """Stream text tokens as Server-Sent Events, passing the full text to on_complete at the end"""
+    def generate():
+        parts = []
+        for token in tokens:
+            parts.append(token)
+            yield b"data: " + orjson.dumps({'t': token}) + b"\n\n"
+        
+        if on_complete:
+            on_complete("".join(parts))
+        yield b"data: " + orjson.dumps({'done': True}) + b"\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def save_chat(user_id, user_message, bot_response):
+    """Store a chat exchange; trimming and summarizing happen after the response is sent"""
+    # Core INSERT: nothing reads the row back, so it skips the ORM unit of work
+    db.session.execute(insert(ChatHistory).values(
+        user_id=user_id,
+        user_message=user_message,
+        bot_response=bot_response
+    ))
+    db.session.commit()
+    
+    # History housekeeping runs in the background so the reply is not held up by it
+    submit_background_task(tidy_chat_history, user_id)
+
+# Exchanges sent verbatim with each message; older ones are folded into the summary
+RECENT_CHAT_COUNT = 5
+# Exchanges shown per page on the chat screen
+CHAT_PAGE_SIZE = 10
+# Exchanges kept per user; older ones are deleted
+CHAT_HISTORY_LIMIT = 50
+
+def chat_message_error(user_message):
+    """Return why a chat message cannot be sent, or None if it is fine"""
+    if not user_message:
+        return 'Please enter a message'
+    if query_too_long(user_message):
+        return 'Message is too long, please shorten it'
+    return None
+
+def load_chat_context(user_id):
+    """Return the user's recent exchanges in chronological order and their running summary"""
+    recent_history = ChatHistory.query.filter_by(user_id=user_id).order_by(ChatHistory.created_at.desc()).limit(RECENT_CHAT_COUNT).all()
+    recent_history.reverse()  # Chronological order
+    summary = db.session.scalar(select(ChatSummary.summary).where(ChatSummary.user_id == user_id))
+    return recent_history, summary
+
+# Users whose history is being tidied in this worker, mapped to whether another save
+# arrived meanwhile. Each chat save queues a tidy task, and two running at once would
+# summarize the same exchanges and both try to create the user's ChatSummary row
+_tidying_users = {}
+_tidying_users_lock = threading.Lock()
+
+def tidy_chat_history(user_id):
+    """Background task: trim a user's chat history, then refresh its summary"""
+    with _tidying_users_lock:
+        if user_id in _tidying_users:
+            # Leave it to the running task, which goes round again once it finishes
+            _tidying_users[user_id] = True
+            return
+        _tidying_users[user_id] = False
+    
+    while True:
+        try:
+            with app.app_context():
+                trim_chat_history(user_id)
+                refresh_chat_summary(user_id)
+        except Exception as e:
+            logger.exception("Chat tidy error: %s", e)
+        with _tidying_users_lock:
+            if not _tidying_users[user_id]:
+                del _tidying_users[user_id]
+                return
+            _tidying_users[user_id] = False
+
+def trim_chat_history(user_id):
+    """Keep only the last CHAT_HISTORY_LIMIT conversations per user"""
+    try:
+        # One indexed seek on (user_id, id) finds the 51st newest row; usually there is none and nothing is deleted
+        boundary_id = db.session.scalar(
+            select(ChatHistory.id).where(ChatHistory.user_id == user_id)
+            .order_by(ChatHistory.id.desc()).offset(CHAT_HISTORY_LIMIT).limit(1)
+        )
+        if boundary_id is None:
+            return
+        db.session.execute(delete(ChatHistory).where(ChatHistory.user_id == user_id, ChatHistory.id <= boundary_id))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Chat history trim error: %s", e)
+
+def prune_chat_history():
+    """Trim every user's history in one statement and return the number of rows deleted"""
+    # Rank each user's rows newest first; anything ranked past the limit goes
+    ranked = select(
+        ChatHistory.id,
+        func.row_number().over(partition_by=ChatHistory.user_id, order_by=ChatHistory.id.desc()).label('rank')
+    ).subquery()
+    stale_ids = select(ranked.c.id).where(ranked.c.rank > CHAT_HISTORY_LIMIT)
+    result = db.session.execute(delete(ChatHistory).where(ChatHistory.id.in_(stale_ids)))
+    db.session.commit()
+    return result.rowcount
+
+def refresh_chat_summary(user_id):
+    """Fold at least RECENT_CHAT_COUNT unsummarized older exchanges into the user's summary"""
+    try:
+        record = db.session.get(ChatSummary, user_id)
+        recent_ids = db.session.scalars(
+            select(ChatHistory.id).where(ChatHistory.user_id == user_id)
+            .order_by(ChatHistory.id.desc()).limit(RECENT_CHAT_COUNT)
+        ).all()
+        if len(recent_ids) < RECENT_CHAT_COUNT:
+            return
+        
+        pending = db.session.scalars(
+            select(ChatHistory).where(
+                ChatHistory.user_id == user_id,
+                ChatHistory.id > (record.last_chat_id if record else 0),
+                ChatHistory.id < min(recent_ids)
+            ).order_by(ChatHistory.id)
+        ).all()
+        if len(pending) < RECENT_CHAT_COUNT:
+            return
+        
+        summary = get_civil_ai().summarize_conversation(record.summary if record else None, pending)
+        if record is None:
+            record = ChatSummary(user_id=user_id)
+            db.session.add(record)
+        record.summary = summary
+        record.last_chat_id = pending[-1].id
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Chat summary error: %s", e)
 
 # Authentication routes
 @app.route('/login', methods=['GET', 'POST'])
@@ -71,51 +260,74 @@ def logout():
 @app.route('/')
 def index():
     """Home page with introduction and features overview"""
-    return render_template('index.html')
+    return render_static_page('index.html')
 
 @app.route('/chat')
 @login_required
 def chat():
     """AI Chat Assistant page"""
     # Get chat history from database for current user
-    chat_history = ChatHistory.query.filter_by(user_id=current_user.id).order_by(ChatHistory.created_at).limit(20).all()
-    return render_template('chat.html', chat_history=chat_history)
+    # Newest page only; older exchanges are fetched on demand from /api/chat/history.
+    # The template only reads column data, so any relationship access is a bug rather than a lazy load
+    chat_history = db.session.scalars(
+        select(ChatHistory).where(ChatHistory.user_id == current_user.id)
+        .order_by(ChatHistory.id.desc()).limit(CHAT_PAGE_SIZE)
+        .options(raiseload('*'))
+    ).all()
+    chat_history.reverse()  # Chronological order
+    has_older = len(chat_history) == CHAT_PAGE_SIZE
+    return render_template('chat.html', chat_history=chat_history, has_older=has_older)
+
+@app.route('/api/chat/history')
+@login_required
+def api_chat_history():
+    """Keyset-paginated chat history: exchanges older than ?before=<id>, oldest first"""
+    before = request.args.get('before', type=int)
+    limit = min(request.args.get('limit', CHAT_PAGE_SIZE, type=int), 50)
+    if not before or limit <= 0:
+        return jsonify({'error': 'A positive before id and limit are required'}), 400
+    
+    chats = db.session.scalars(
+        select(ChatHistory).where(ChatHistory.user_id == current_user.id, ChatHistory.id < before)
+        .order_by(ChatHistory.id.desc()).limit(limit)
+        .options(raiseload('*'))
+    ).all()
+    chats.reverse()  # Chronological order
+    
+    return jsonify({
+        'success': True,
+        'messages': [{
+            'id': chat.id,
+            'user_message': chat.user_message,
+            'bot_response': chat.bot_response,
+            'time': chat.created_at.strftime('%H:%M')
+        } for chat in chats],
+        'has_more': len(chats) == limit
+    })
 
 # AJAX endpoints for dynamic chat
 @app.route('/api/chat', methods=['POST'])
 @login_required
 def api_chat():
     """AJAX endpoint for chat messages"""
+    return chat_response(request.get_json())
+
+def chat_response(data):
+    """Answer a chat message for the logged-in user and save the exchange"""
     try:
-        data = request.get_json()
         user_message = data.get('message', '').strip()
         
-        if not user_message:
-            return jsonify({'error': 'Please enter a message'}), 400
+        error = chat_message_error(user_message)
+        if error:
+            return jsonify({'error': error}), 400
         
         # Get conversation history for context
-        recent_history = ChatHistory.query.filter_by(user_id=current_user.id).order_by(ChatHistory.created_at.desc()).limit(5).all()
-        recent_history.reverse()  # Chronological order
+        recent_history, summary = load_chat_context(current_user.id)
         
         # Get AI response with context
-        ai_response = civil_ai.get_civil_engineering_response(user_message, recent_history)
-        
-        # Store in database
-        chat_record = ChatHistory(
-            user_id=current_user.id,
-            user_message=user_message,
-            bot_response=ai_response
-        )
-        db.session.add(chat_record)
-        db.session.commit()
+        ai_response = get_civil_ai().get_civil_engineering_response(user_message, recent_history, summary)
         
-        # Keep only last 50 conversations per user
-        total_chats = ChatHistory.query.filter_by(user_id=current_user.id).count()
-        if total_chats > 50:
-            old_chats = ChatHistory.query.filter_by(user_id=current_user.id).order_by(ChatHistory.created_at).limit(total_chats - 50).all()
-            for chat in old_chats:
-                db.session.delete(chat)
-            db.session.commit()
+        save_chat(current_user.id, user_message, ai_response)
         
         return jsonify({
             'success': True,
@@ -124,83 +336,139 @@ def api_chat():
         })
         
     except Exception as e:
-        logging.error(f"AJAX Chat error: {str(e)}")
+        logger.exception("AJAX Chat error: %s", e)
         return jsonify({'error': f'Error getting AI response: {str(e)}'}), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+@login_required
+def api_chat_stream():
+    """Streaming chat endpoint that sends the AI response as Server-Sent Events"""
+    data = request.get_json(silent=True) or request.form
+    user_message = data.get('message', '').strip()
+    
+    error = chat_message_error(user_message)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    try:
+        civil_ai = get_civil_ai()
+    except Exception as e:
+        logger.exception("Streaming chat unavailable: %s", e)
+        return jsonify({'error': 'The AI assistant is unavailable right now. Please try again later.'}), 503
+    
+    user_id = current_user.id
+    recent_history, summary = load_chat_context(user_id)
+    
+    def save(response_text):
+        try:
+            save_chat(user_id, user_message, response_text)
+        except Exception as e:
+            logger.exception("Streaming chat save error: %s", e)
+    
+    return sse_response(civil_ai.stream_civil_engineering_response(user_message, recent_history, summary), save)
+
+def parse_floats(values, fields):
+    """Read (name, default) fields from a form or JSON mapping as finite floats, raising ValueError otherwise"""
+    try:
+        numbers = [float(values.get(name, default)) for name, default in fields]
+    except TypeError as e:
+        # JSON null, lists and objects are bad input too, not server errors
+        raise ValueError(str(e)) from e
+    if not all(map(math.isfinite, numbers)):
+        raise ValueError("non-finite number")
+    return numbers
+
+# Beam design inputs
+BEAM_FIELDS = (('span', 0), ('load', 0))
+# Room dimensions, then unit costs in ₹/bag, ₹/m³, ₹/m³ and ₹/kg
+ESTIMATION_FIELDS = (
+    ('length', 0), ('width', 0), ('height', 0),
+    ('cement_rate', 450), ('sand_rate', 1500), ('aggregate_rate', 1200), ('steel_rate', 60)
+)
+# Concrete volume (m³ or ft³) and water-cement ratio
+CONCRETE_MIX_FIELDS = (('volume', 0), ('water_cement_ratio', 0.5))
+
+def is_htmx_request():
+    """True when the request came from an htmx form that swaps in only the results panel"""
+    return request.headers.get('HX-Request') == 'true'
+
+def form_error(message, category, endpoint):
+    """Show a form error inline for htmx requests, otherwise flash it and redirect back"""
+    if is_htmx_request():
+        return render_template('_form_error.html', message=message, category=category)
+    flash(message, category)
+    return redirect(url_for(endpoint))
+
 @app.route('/calculator')
 def calculator():
     """Structural Calculator page"""
-    return render_template('calculator.html')
+    return render_static_page('calculator.html')
 
 @app.route('/calculator', methods=['POST'])
 def calculator_post():
     """Handle structural calculations"""
     try:
         # Get form data
-        span = float(request.form.get('span', 0))
-        load = float(request.form.get('load', 0))
+        span, load = parse_floats(request.form, BEAM_FIELDS)
         concrete_grade = request.form.get('concrete_grade', 'M25')
         steel_grade = request.form.get('steel_grade', 'Fe415')
         
         if span <= 0 or load <= 0:
-            flash('Please enter valid span and load values', 'warning')
-            return redirect(url_for('calculator'))
+            return form_error('Please enter valid span and load values', 'warning', 'calculator')
         
         # Perform calculations
-        results = structural_calc.calculate_beam_design(span, load, concrete_grade, steel_grade)
+        results = beam_design(span, load, concrete_grade, steel_grade)
         
-        return render_template('calculator.html', results=results, 
+        # htmx swaps just the results panel, skipping the page shell
+        template = '_calculator_results.html' if is_htmx_request() else 'calculator.html'
+        return render_template(template, results=results, 
                              span=span, load=load, concrete_grade=concrete_grade, steel_grade=steel_grade)
         
     except ValueError:
-        flash('Please enter valid numeric values', 'error')
+        return form_error('Please enter valid numeric values', 'error', 'calculator')
     except Exception as e:
-        logging.error(f"Calculator error: {str(e)}")
-        flash(f'Calculation error: {str(e)}', 'error')
-    
-    return redirect(url_for('calculator'))
+        logger.exception("Calculator error: %s", e)
+        return form_error(f'Calculation error: {str(e)}', 'error', 'calculator')
 
 @app.route('/estimation')
 def estimation():
     """Material Estimation (BOQ Generator) page"""
-    return render_template('estimation.html')
+    return render_static_page('estimation.html')
 
 @app.route('/estimation', methods=['POST'])
 def estimation_post():
     """Handle material estimation calculations"""
     try:
-        # Get room dimensions
-        length = float(request.form.get('length', 0))
-        width = float(request.form.get('width', 0))
-        height = float(request.form.get('height', 0))
-        
-        # Get unit costs
-        cement_rate = float(request.form.get('cement_rate', 450))  # ₹/bag
-        sand_rate = float(request.form.get('sand_rate', 1500))     # ₹/m³
-        aggregate_rate = float(request.form.get('aggregate_rate', 1200))  # ₹/m³
-        steel_rate = float(request.form.get('steel_rate', 60))     # ₹/kg
+        # Get room dimensions and unit costs
+        length, width, height, cement_rate, sand_rate, aggregate_rate, steel_rate = parse_floats(request.form, ESTIMATION_FIELDS)
         
         if length <= 0 or width <= 0 or height <= 0:
-            flash('Please enter valid room dimensions', 'warning')
-            return redirect(url_for('estimation'))
+            return form_error('Please enter valid room dimensions', 'warning', 'estimation')
         
         # Calculate material quantities and costs
-        estimation = material_estimator.calculate_quantities(
+        estimation = material_quantities(
             length, width, height, cement_rate, sand_rate, aggregate_rate, steel_rate
         )
+        context = dict(estimation=estimation,
+                       length=length, width=width, height=height,
+                       cement_rate=cement_rate, sand_rate=sand_rate,
+                       aggregate_rate=aggregate_rate, steel_rate=steel_rate)
+        
+        # htmx swaps just the results panel, skipping the page shell
+        if is_htmx_request():
+            return render_template('_estimation_results.html', **context)
         
-        return render_template('estimation.html', estimation=estimation,
-                             length=length, width=width, height=height,
-                             cement_rate=cement_rate, sand_rate=sand_rate,
-                             aggregate_rate=aggregate_rate, steel_rate=steel_rate)
+        # Streamed pages send the session cookie before the layout runs, so take the
+        # flash out of the session now; the layout reads it back from the request
+        get_flashed_messages()
+        # Stream the result page so the layout reaches the browser while the tables render
+        return stream_template('estimation.html', **context)
         
     except ValueError:
-        flash('Please enter valid numeric values', 'error')
+        return form_error('Please enter valid numeric values', 'error', 'estimation')
     except Exception as e:
-        logging.error(f"Estimation error: {str(e)}")
-        flash(f'Estimation error: {str(e)}', 'error')
-    
-    return redirect(url_for('estimation'))
+        logger.exception("Estimation error: %s", e)
+        return form_error(f'Estimation error: {str(e)}', 'error', 'estimation')
 
 @app.route('/scheduler')
 @login_required
@@ -210,41 +478,42 @@ def scheduler():
     saved_schedules = ProjectSchedule.query.filter_by(user_id=current_user.id).order_by(ProjectSchedule.updated_at.desc()).all()
     return render_template('scheduler.html', saved_schedules=saved_schedules)
 
+# Shown in place of the AI analysis when the assistant cannot be reached
+SCHEDULE_ANALYSIS_UNAVAILABLE = "AI analysis is unavailable right now. Your schedule has been saved."
+
 @app.route('/scheduler', methods=['POST'])
 @login_required
 def scheduler_post():
     """Handle project scheduling"""
     try:
-        # Get task data from form
-        tasks_data = []
-        task_count = 0
         schedule_name = request.form.get('schedule_name', 'My Project').strip()
         
-        # Extract tasks from form data
-        while f'task_{task_count}' in request.form:
-            task_name = request.form.get(f'task_{task_count}', '').strip()
-            duration = request.form.get(f'duration_{task_count}', '0')
-            
-            if task_name and duration:
-                tasks_data.append({
-                    'name': task_name,
-                    'duration': int(duration)
-                })
-            task_count += 1
+        # Task rows post their fields as parallel task[] and duration[] lists
+        tasks_data = [
+            {'name': task_name.strip(), 'duration': int(duration)}
+            for task_name, duration in zip(request.form.getlist('task[]'), request.form.getlist('duration[]'))
+            if task_name.strip() and duration
+        ]
         
         if not tasks_data:
             flash('Please add at least one task', 'warning')
             return redirect(url_for('scheduler'))
         
-        # Create schedule and get AI analysis
+        # Start the AI analysis first so the Groq round trip overlaps the schedule build;
+        # the schedule is still saved when the assistant is unavailable
+        try:
+            analysis_future = submit_ai_call(get_civil_ai().analyze_project_schedule, tasks_data)
+        except Exception as e:
+            logger.exception("Schedule analysis unavailable: %s", e)
+            analysis_future = None
         schedule = project_scheduler.create_schedule(tasks_data)
-        ai_analysis = civil_ai.analyze_project_schedule(tasks_data)
+        ai_analysis = analysis_future.result() if analysis_future else SCHEDULE_ANALYSIS_UNAVAILABLE
         
         # Save to database
         project_schedule = ProjectSchedule(
             user_id=current_user.id,
             schedule_name=schedule_name,
-            tasks_data=json.dumps(tasks_data),
+            tasks_data=orjson.dumps(tasks_data).decode('utf-8'),
             ai_analysis=ai_analysis
         )
         db.session.add(project_schedule)
@@ -255,14 +524,17 @@ def scheduler_post():
         # Get user's saved schedules for display
         saved_schedules = ProjectSchedule.query.filter_by(user_id=current_user.id).order_by(ProjectSchedule.updated_at.desc()).all()
         
-        return render_template('scheduler.html', schedule=schedule, 
+        # Streamed pages send the session cookie before the layout runs, so take the
+        # flash out of the session now; the layout reads it back from the request
+        get_flashed_messages()
+        return stream_template('scheduler.html', schedule=schedule, 
                              ai_analysis=ai_analysis, tasks_data=tasks_data,
                              saved_schedules=saved_schedules, schedule_name=schedule_name)
         
     except ValueError:
         flash('Please enter valid duration values', 'error')
     except Exception as e:
-        logging.error(f"Scheduler error: {str(e)}")
+        logger.exception("Scheduler error: %s", e)
         flash(f'Scheduling error: {str(e)}', 'error')
     
     return redirect(url_for('scheduler'))
@@ -270,7 +542,7 @@ def scheduler_post():
 @app.route('/safety')
 def safety():
     """Site Safety & Image Analysis page"""
-    return render_template('safety.html')
+    return render_static_page('safety.html')
 
 @app.route('/safety', methods=['POST'])
 def safety_post():
@@ -286,20 +558,16 @@ def safety_post():
             flash('No image file selected', 'warning')
             return redirect(url_for('safety'))
         
-        if file and allowed_file(file.filename):
-            # Read and encode image
-            image_data = file.read()
-            base64_image = base64.b64encode(image_data).decode('utf-8')
-            
-            # Get AI analysis of the image for safety
-            analysis = civil_ai.analyze_safety_image(base64_image)
+        if file and allowed_file(file.filename) and upload_starts_with(file, _IMAGE_SIGNATURES):
+            # The checklist does not depend on the image, so only its first bytes are read
+            analysis = get_civil_ai().analyze_safety_image()
             
             return render_template('safety.html', analysis=analysis)
         else:
             flash('Invalid file format. Please upload an image file (PNG, JPG, JPEG, GIF, BMP)', 'error')
             
     except Exception as e:
-        logging.error(f"Safety analysis error: {str(e)}")
+        logger.exception("Safety analysis error: %s", e)
         flash(f'Image analysis error: {str(e)}', 'error')
     
     return redirect(url_for('safety'))
@@ -307,12 +575,19 @@ def safety_post():
 @app.route('/about')
 def about():
     """About page with app information"""
-    return render_template('about.html')
+    return render_static_page('about.html')
 
 @app.route('/account')
 @login_required
 def account():
     """User account page"""
+    # Load the statistics collections up front, one IN query each, instead of lazily from the template
+    stmt = (select(User)
+            .options(selectinload(User.chat_histories),
+                     selectinload(User.project_schedules),
+                     selectinload(User.generated_images))
+            .where(User.id == current_user.id))
+    db.session.execute(stmt).scalar_one()
     return render_template('account.html')
 
 @app.route('/edit-profile', methods=['GET', 'POST'])
@@ -379,7 +654,7 @@ def load_schedule(schedule_id):
             return redirect(url_for('scheduler'))
         
         # Parse tasks data
-        tasks_data = json.loads(schedule_record.tasks_data)
+        tasks_data = orjson.loads(schedule_record.tasks_data)
         
         # Create schedule
         schedule = project_scheduler.create_schedule(tasks_data)
@@ -392,7 +667,7 @@ def load_schedule(schedule_id):
                              saved_schedules=saved_schedules, schedule_name=schedule_record.schedule_name)
         
     except Exception as e:
-        logging.error(f"Load schedule error: {str(e)}")
+        logger.exception("Load schedule error: %s", e)
         flash(f'Error loading schedule: {str(e)}', 'error')
         return redirect(url_for('scheduler'))
 
@@ -409,90 +684,109 @@ def kg_to_lbs(kg):
     """Convert kg to pounds"""
     return kg * 2.20462
 
+# Concrete mix ratios for different grades (cement, sand, aggregate)
+CONCRETE_MIX_RATIOS = {
+    'M15': (1, 2, 4),
+    'M20': (1, 1.5, 3),
+    'M25': (1, 1, 2),
+    'M30': (1, 1, 1.5),
+    'M35': (1, 1, 1.2)
+}
+# Approximate densities in kg/m³, in the same order
+CONCRETE_MIX_DENSITIES = (1440, 1600, 1500)
+
+def _mix_factors(ratio):
+    """Volume fraction and weight per m³ of concrete for each material in a mix ratio"""
+    total_ratio = sum(ratio)
+    materials = tuple(
+        (name, part / total_ratio, part / total_ratio * density)
+        for name, part, density in zip(('cement', 'sand', 'aggregate'), ratio, CONCRETE_MIX_DENSITIES)
+    )
+    return {
+        'mix_ratio': ':'.join(str(part) for part in ratio),
+        'materials': materials,
+        'cement_kg_per_m3': materials[0][2]
+    }
+
+# Per-grade factors computed once, so a request only scales them by its volume
+CONCRETE_MIX = {grade: _mix_factors(ratio) for grade, ratio in CONCRETE_MIX_RATIOS.items()}
+
+# Exact cubic foot conversions
+FT3_TO_M3 = 0.028316846592
+M3_TO_FT3 = 1 / FT3_TO_M3
+
+# Per input unit: factors that bring lengths and volumes to meters, and whether the
+# response also carries imperial figures. Any other unit is treated as meters.
+INPUT_UNITS = {
+    'meters': {'to_m': 1.0, 'to_m3': 1.0, 'imperial': False},
+    'feet': {'to_m': 0.3048, 'to_m3': FT3_TO_M3, 'imperial': True}
+}
+
+def input_units(unit):
+    """Return the INPUT_UNITS entry for a request's unit, or None if the unit is not a string"""
+    if not isinstance(unit, str):
+        return None
+    return INPUT_UNITS.get(unit, INPUT_UNITS['meters'])
+
 # Concrete Mix Calculator routes
 @app.route('/concrete-calculator')
 def concrete_calculator():
     """Concrete Mix Calculator page"""
-    return render_template('concrete_calculator.html')
+    return render_static_page('concrete_calculator.html')
 
 @app.route('/api/concrete-mix', methods=['POST'])
 def api_concrete_mix():
     """AJAX endpoint for concrete mix calculations"""
+    return concrete_mix_response(request.get_json(silent=True))
+
+def concrete_mix_response(data):
+    """Material quantities for a concrete mix request"""
     try:
-        data = request.get_json()
-        
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Please send the mix as a JSON object'}), 400
         # Get inputs
         grade = data.get('grade', 'M20')
-        volume = float(data.get('volume', 0))  # in cubic meters
-        water_cement_ratio = float(data.get('water_cement_ratio', 0.5))
-        unit = data.get('unit', 'meters')  # meters or feet
+        volume, water_cement_ratio = parse_floats(data, CONCRETE_MIX_FIELDS)
+        units = input_units(data.get('unit', 'meters'))  # meters or feet
+        if units is None:
+            return jsonify({'error': 'Please choose meters or feet'}), 400
         
-        # Convert to meters if input is in feet
-        if unit == 'feet':
-            volume = feet_to_meters(volume) ** 3  # cubic feet to cubic meters
+        # Convert to cubic meters if input is in cubic feet
+        volume *= units['to_m3']
         
         if volume <= 0:
             return jsonify({'error': 'Please enter valid volume'}), 400
         
-        # Concrete mix ratios for different grades (cement:sand:aggregate)
-        mix_ratios = {
-            'M15': {'cement': 1, 'sand': 2, 'aggregate': 4},
-            'M20': {'cement': 1, 'sand': 1.5, 'aggregate': 3},
-            'M25': {'cement': 1, 'sand': 1, 'aggregate': 2},
-            'M30': {'cement': 1, 'sand': 1, 'aggregate': 1.5},
-            'M35': {'cement': 1, 'sand': 1, 'aggregate': 1.2}
-        }
-        
-        if grade not in mix_ratios:
+        mix = CONCRETE_MIX.get(grade)
+        if mix is None:
             return jsonify({'error': 'Invalid concrete grade'}), 400
         
-        ratio = mix_ratios[grade]
-        total_ratio = ratio['cement'] + ratio['sand'] + ratio['aggregate']
-        
-        # Calculate quantities
-        cement_volume = (ratio['cement'] / total_ratio) * volume
-        sand_volume = (ratio['sand'] / total_ratio) * volume
-        aggregate_volume = (ratio['aggregate'] / total_ratio) * volume
-        
-        # Convert to weight (approximate densities in kg/m³)
-        cement_weight = cement_volume * 1440  # kg
-        sand_weight = sand_volume * 1600  # kg
-        aggregate_weight = aggregate_volume * 1500  # kg
-        
-        # Convert to bags (1 bag = 50kg)
-        cement_bags = cement_weight / 50
-        water_required = cement_weight * water_cement_ratio  # liters
-        
+        # Calculate quantities: each material's volume and weight scale linearly with the concrete volume
         results = {
             'grade': grade,
             'volume': volume,
-            'cement': {
-                'weight_kg': round(cement_weight, 2),
-                'bags': round(cement_bags, 2),
-                'volume_m3': round(cement_volume, 3)
-            },
-            'sand': {
-                'weight_kg': round(sand_weight, 2),
-                'volume_m3': round(sand_volume, 3)
-            },
-            'aggregate': {
-                'weight_kg': round(aggregate_weight, 2),
-                'volume_m3': round(aggregate_volume, 3)
-            },
-            'water_liters': round(water_required, 2),
-            'mix_ratio': f"{ratio['cement']}:{ratio['sand']}:{ratio['aggregate']}"
+            'mix_ratio': mix['mix_ratio']
         }
+        for name, fraction, kg_per_m3 in mix['materials']:
+            results[name] = {
+                'weight_kg': round(kg_per_m3 * volume, 2),
+                'volume_m3': round(fraction * volume, 3)
+            }
+            # Add feet conversions if requested
+            if units['imperial']:
+                results[name]['volume_ft3'] = round(fraction * volume * M3_TO_FT3, 3)
         
-        # Add feet conversions if requested
-        if unit == 'feet':
-            results['cement']['volume_ft3'] = round(cement_volume * 35.3147, 3)
-            results['sand']['volume_ft3'] = round(sand_volume * 35.3147, 3)
-            results['aggregate']['volume_ft3'] = round(aggregate_volume * 35.3147, 3)
+        # Convert to bags (1 bag = 50kg)
+        cement_weight = mix['cement_kg_per_m3'] * volume  # kg
+        results['cement']['bags'] = round(cement_weight / 50, 2)
+        results['water_liters'] = round(cement_weight * water_cement_ratio, 2)  # liters
         
         return jsonify({'success': True, 'results': results})
         
+    except ValueError:
+        return jsonify({'error': 'Please enter valid numeric values'}), 400
     except Exception as e:
-        logging.error(f"Concrete mix calculation error: {str(e)}")
+        logger.exception("Concrete mix calculation error: %s", e)
         return jsonify({'error': f'Calculation error: {str(e)}'}), 500
 
 # Steel Weight Calculator routes
@@ -585,150 +879,41 @@ def cost_calculator():
         except ValueError:
             flash('Please enter valid numeric values', 'error')
         except Exception as e:
-            logging.error(f"Cost calculation error: {str(e)}")
+            logger.exception("Cost calculation error: %s", e)
             flash(f'Cost calculation error: {str(e)}', 'error')
     
     return render_template('cost_calculator.html', cost_estimation=cost_estimation)
 
+# Factor from each unit to its type's canonical unit (m, kg, sqm, cum, N/mm²), using exact SI definitions
+UNIT_FACTORS = {
+    'length': {'m': 1.0, 'ft': 0.3048, 'in': 0.0254, 'mm': 0.001, 'cm': 0.01, 'km': 1000.0,
+               'yd': 0.9144, 'mi': 1609.344},
+    'weight': {'kg': 1.0, 'ton': 1000.0, 'g': 0.001, 'lb': 0.45359237, 'oz': 0.028349523125},
+    'area': {'sqm': 1.0, 'sqft': 0.09290304, 'sqin': 0.00064516, 'acre': 4046.8564224,
+             'hectare': 10000.0},
+    'volume': {'cum': 1.0, 'cuft': FT3_TO_M3, 'liter': 0.001, 'gallon': 0.003785411784},  # US gallon
+    'pressure': {'nmm2': 1.0, 'mpa': 1.0, 'psi': 0.45359237 * 9.80665 / 25.4**2, 'bar': 0.1, 'kpa': 0.001}  # psi = lbf/in²
+}
+
+@functools.lru_cache(maxsize=4096)
+def _convert(value, from_unit, to_unit, conversion_type):
+    """Pure conversion arithmetic, memoized since the same standard values recur"""
+    factors = UNIT_FACTORS[conversion_type]
+    return round(value * factors[from_unit] / factors[to_unit], 6)
+
 def convert_units(value, from_unit, to_unit, conversion_type):
     """Convert units based on type and return result"""
     try:
-        # Length conversions
-        if conversion_type == 'length':
-            # Convert to meters first
-            if from_unit == 'ft':
-                value_in_m = value / 3.28084
-            elif from_unit == 'in':
-                value_in_m = value / 39.3701
-            elif from_unit == 'mm':
-                value_in_m = value / 1000
-            elif from_unit == 'cm':
-                value_in_m = value / 100
-            elif from_unit == 'km':
-                value_in_m = value * 1000
-            elif from_unit == 'yd':
-                value_in_m = value / 1.09361
-            elif from_unit == 'mi':
-                value_in_m = value * 1609.34
-            else:  # meters
-                value_in_m = value
-                
-            # Convert from meters to target unit
-            if to_unit == 'ft':
-                result_value = value_in_m * 3.28084
-            elif to_unit == 'in':
-                result_value = value_in_m * 39.3701
-            elif to_unit == 'mm':
-                result_value = value_in_m * 1000
-            elif to_unit == 'cm':
-                result_value = value_in_m * 100
-            elif to_unit == 'km':
-                result_value = value_in_m / 1000
-            elif to_unit == 'yd':
-                result_value = value_in_m * 1.09361
-            elif to_unit == 'mi':
-                result_value = value_in_m / 1609.34
-            else:  # meters
-                result_value = value_in_m
-                
-        # Weight conversions
-        elif conversion_type == 'weight':
-            # Convert to kg first
-            if from_unit == 'ton':
-                value_in_kg = value * 1000
-            elif from_unit == 'g':
-                value_in_kg = value / 1000
-            elif from_unit == 'lb':
-                value_in_kg = value / 2.20462
-            elif from_unit == 'oz':
-                value_in_kg = value / 35.274
-            else:  # kg
-                value_in_kg = value
-                
-            # Convert from kg to target unit
-            if to_unit == 'ton':
-                result_value = value_in_kg / 1000
-            elif to_unit == 'g':
-                result_value = value_in_kg * 1000
-            elif to_unit == 'lb':
-                result_value = value_in_kg * 2.20462
-            elif to_unit == 'oz':
-                result_value = value_in_kg * 35.274
-            else:  # kg
-                result_value = value_in_kg
-                
-        # Area conversions
-        elif conversion_type == 'area':
-            # Convert to sqm first
-            if from_unit == 'sqft':
-                value_in_sqm = value / 10.7639
-            elif from_unit == 'acre':
-                value_in_sqm = value * 4047
-            elif from_unit == 'hectare':
-                value_in_sqm = value * 10000
-            else:  # sqm
-                value_in_sqm = value
-                
-            # Convert from sqm to target unit
-            if to_unit == 'sqft':
-                result_value = value_in_sqm * 10.7639
-            elif to_unit == 'acre':
-                result_value = value_in_sqm / 4047
-            elif to_unit == 'hectare':
-                result_value = value_in_sqm / 10000
-            else:  # sqm
-                result_value = value_in_sqm
-                
-        # Volume conversions
-        elif conversion_type == 'volume':
-            # Convert to cum first
-            if from_unit == 'cuft':
-                value_in_cum = value / 35.3147
-            elif from_unit == 'liter':
-                value_in_cum = value / 1000
-            else:  # cum
-                value_in_cum = value
-                
-            # Convert from cum to target unit
-            if to_unit == 'cuft':
-                result_value = value_in_cum * 35.3147
-            elif to_unit == 'liter':
-                result_value = value_in_cum * 1000
-            else:  # cum
-                result_value = value_in_cum
-                
-        # Pressure conversions
-        elif conversion_type == 'pressure':
-            # Convert to N/mm² first
-            if from_unit == 'psi':
-                value_in_nmm2 = value / 145.038
-            elif from_unit == 'mpa':
-                value_in_nmm2 = value
-            elif from_unit == 'bar':
-                value_in_nmm2 = value / 10
-            else:  # nmm2
-                value_in_nmm2 = value
-                
-            # Convert from N/mm² to target unit
-            if to_unit == 'psi':
-                result_value = value_in_nmm2 * 145.038
-            elif to_unit == 'mpa':
-                result_value = value_in_nmm2
-            elif to_unit == 'bar':
-                result_value = value_in_nmm2 * 10
-            else:  # nmm2
-                result_value = value_in_nmm2
-        
         return {
             'original_value': value,
             'from_unit': from_unit,
-            'result_value': round(result_value, 6),
+            'result_value': _convert(value, from_unit, to_unit, conversion_type),
             'to_unit': to_unit,
             'conversion_type': conversion_type
         }
         
     except Exception as e:
-        logging.error(f"Unit conversion error: {str(e)}")
+        logger.exception("Unit conversion error: %s", e)
         return {'error': str(e)}
 
 def calculate_project_cost(project_type, area, floors, cement_rate, sand_rate, aggregate_rate, steel_rate, brick_rate, labor_rate, other_costs):
@@ -766,15 +951,15 @@ def calculate_project_cost(project_type, area, floors, cement_rate, sand_rate, a
         material_cost = cement_cost + sand_cost + aggregate_cost + steel_cost + brick_cost
         total_cost = material_cost + labor_cost + other_cost
         
-        # Get AI analysis
-        ai_analysis = civil_ai.analyze_project_cost({
+        # Start the AI analysis and assemble the breakdown while it is in flight
+        analysis_future = submit_ai_call(get_civil_ai().analyze_project_cost, {
             'project_type': project_type,
             'area': total_area,
             'total_cost': total_cost,
             'cost_per_sqft': total_cost / total_area
         })
         
-        return {
+        estimation = {
             'project_type': project_type,
             'area': area,
             'floors': floors,
@@ -790,113 +975,73 @@ def calculate_project_cost(project_type, area, floors, cement_rate, sand_rate, a
                 'aggregate': {'quantity': round(aggregate_cum, 3), 'unit': 'm³', 'rate': aggregate_rate, 'cost': aggregate_cost},
                 'steel': {'quantity': round(steel_kg, 2), 'unit': 'kg', 'rate': steel_rate, 'cost': steel_cost},
                 'bricks': {'quantity': int(bricks), 'unit': 'nos', 'rate': f'{brick_rate}/1000', 'cost': brick_cost}
-            },
-            'ai_analysis': ai_analysis
+            }
         }
+        estimation['ai_analysis'] = analysis_future.result()
+        return estimation
         
     except Exception as e:
-        logging.error(f"Cost calculation error: {str(e)}")
+        logger.exception("Cost calculation error: %s", e)
         return {'error': str(e)}
 
+# Per construction type: label, the input the quantities scale with, and (material, amount per unit, formatter)
+# Water is 25 liters per cement bag throughout
+MATERIAL_ESTIMATES = {
+    # For 9-inch brick wall, per sqm; the brick count is truncated to whole bricks
+    'brick_wall': ('Brick Wall (9 inch)', 'area', (
+        ('Bricks', 120, lambda bricks: f"{int(bricks)} nos"),
+        ('Cement', 0.3, '{:.2f} bags (50kg each)'.format),
+        ('Sand', 0.05, '{:.3f} cubic meters'.format),
+        ('Water', 0.3 * 25, '{:.0f} liters'.format)
+    )),
+    # For 6-inch RCC slab: 0.152 cum of concrete per sqm
+    'concrete_slab': ('RCC Slab (6 inch)', 'area', (
+        ('Concrete Volume', 0.152, '{:.3f} cubic meters'.format),
+        ('Cement', 0.152 * 7, '{:.2f} bags (50kg each)'.format),
+        ('Sand', 0.152 * 0.42, '{:.3f} cubic meters'.format),
+        ('Aggregate (20mm)', 0.152 * 0.84, '{:.3f} cubic meters'.format),
+        ('Steel Reinforcement', 12, '{:.2f} kg'.format),
+        ('Water', 0.152 * 7 * 25, '{:.0f} liters'.format)
+    )),
+    # For 12mm thick plaster, per sqm
+    'plaster': ('Plastering (12mm thick)', 'area', (
+        ('Cement', 0.18, '{:.2f} bags (50kg each)'.format),
+        ('Sand', 0.015, '{:.3f} cubic meters'.format),
+        ('Water', 0.18 * 25, '{:.0f} liters'.format)
+    )),
+    # For tile flooring, per sqm
+    'flooring': ('Tile Flooring', 'area', (
+        ('Tiles', 1.05, '{:.2f} square meters (with 5% wastage)'.format),
+        ('Cement', 0.25, '{:.2f} bags (50kg each)'.format),
+        ('Sand', 0.02, '{:.3f} cubic meters'.format),
+        ('Tile Adhesive', 5, '{:.2f} kg'.format),
+        ('Water', 0.25 * 25, '{:.0f} liters'.format)
+    )),
+    # For strip foundation (1m deep, 0.5m wide), per meter of length: 0.5 cum of concrete
+    'foundation': ('Strip Foundation (1m deep, 0.5m wide)', 'length', (
+        ('Concrete Volume', 0.5, '{:.3f} cubic meters'.format),
+        ('Cement', 0.5 * 6.5, '{:.2f} bags (50kg each)'.format),
+        ('Sand', 0.5 * 0.45, '{:.3f} cubic meters'.format),
+        ('Aggregate (20mm)', 0.5 * 0.9, '{:.3f} cubic meters'.format),
+        ('Steel Reinforcement', 0.5 * 60, '{:.2f} kg'.format),
+        ('Water', 0.5 * 6.5 * 25, '{:.0f} liters'.format),
+        ('Excavation Volume', 0.5, '{:.3f} cubic meters'.format)
+    ))
+}
+
 def estimate_materials(area, construction_type):
     """Estimate materials based on area and construction type"""
     try:
-        if construction_type == 'brick_wall':
-            # For 9-inch brick wall
-            bricks = area * 120  # bricks per sqm
-            cement_bags = area * 0.3  # bags per sqm
-            sand_cum = area * 0.05  # cubic meters per sqm
-            
-            return {
-                'construction_type': 'Brick Wall (9 inch)',
-                'area': area,
-                'materials': {
-                    'Bricks': f"{int(bricks)} nos",
-                    'Cement': f"{cement_bags:.2f} bags (50kg each)",
-                    'Sand': f"{sand_cum:.3f} cubic meters",
-                    'Water': f"{cement_bags * 25:.0f} liters"
-                }
-            }
-            
-        elif construction_type == 'concrete_slab':
-            # For 6-inch RCC slab
-            concrete_cum = area * 0.152  # cubic meters
-            cement_bags = concrete_cum * 7  # bags per cum
-            sand_cum = concrete_cum * 0.42  # cubic meters
-            aggregate_cum = concrete_cum * 0.84  # cubic meters
-            steel_kg = area * 12  # kg per sqm
-            
-            return {
-                'construction_type': 'RCC Slab (6 inch)',
-                'area': area,
-                'materials': {
-                    'Concrete Volume': f"{concrete_cum:.3f} cubic meters",
-                    'Cement': f"{cement_bags:.2f} bags (50kg each)",
-                    'Sand': f"{sand_cum:.3f} cubic meters",
-                    'Aggregate (20mm)': f"{aggregate_cum:.3f} cubic meters",
-                    'Steel Reinforcement': f"{steel_kg:.2f} kg",
-                    'Water': f"{cement_bags * 25:.0f} liters"
-                }
-            }
-            
-        elif construction_type == 'plaster':
-            # For 12mm thick plaster
-            cement_bags = area * 0.18  # bags per sqm
-            sand_cum = area * 0.015  # cubic meters per sqm
-            
-            return {
-                'construction_type': 'Plastering (12mm thick)',
-                'area': area,
-                'materials': {
-                    'Cement': f"{cement_bags:.2f} bags (50kg each)",
-                    'Sand': f"{sand_cum:.3f} cubic meters",
-                    'Water': f"{cement_bags * 25:.0f} liters"
-                }
-            }
-            
-        elif construction_type == 'flooring':
-            # For tile flooring
-            tiles_sqm = area * 1.05  # 5% extra for wastage
-            cement_bags = area * 0.25  # bags per sqm
-            sand_cum = area * 0.02  # cubic meters per sqm
-            
-            return {
-                'construction_type': 'Tile Flooring',
-                'area': area,
-                'materials': {
-                    'Tiles': f"{tiles_sqm:.2f} square meters (with 5% wastage)",
-                    'Cement': f"{cement_bags:.2f} bags (50kg each)",
-                    'Sand': f"{sand_cum:.3f} cubic meters",
-                    'Tile Adhesive': f"{area * 5:.2f} kg",
-                    'Water': f"{cement_bags * 25:.0f} liters"
-                }
-            }
-            
-        elif construction_type == 'foundation':
-            # For strip foundation (1m deep, 0.5m wide)
-            length = area  # assuming area represents length for strip foundation
-            concrete_cum = length * 1 * 0.5  # cubic meters
-            cement_bags = concrete_cum * 6.5  # bags per cum
-            sand_cum = concrete_cum * 0.45  # cubic meters
-            aggregate_cum = concrete_cum * 0.9  # cubic meters
-            steel_kg = concrete_cum * 60  # kg per cum
-            
-            return {
-                'construction_type': 'Strip Foundation (1m deep, 0.5m wide)',
-                'length': area,
-                'materials': {
-                    'Concrete Volume': f"{concrete_cum:.3f} cubic meters",
-                    'Cement': f"{cement_bags:.2f} bags (50kg each)",
-                    'Sand': f"{sand_cum:.3f} cubic meters",
-                    'Aggregate (20mm)': f"{aggregate_cum:.3f} cubic meters",
-                    'Steel Reinforcement': f"{steel_kg:.2f} kg",
-                    'Water': f"{cement_bags * 25:.0f} liters",
-                    'Excavation Volume': f"{concrete_cum:.3f} cubic meters"
-                }
-            }
+        # For a strip foundation the area field holds its length
+        label, measure, materials = MATERIAL_ESTIMATES[construction_type]
+        return {
+            'construction_type': label,
+            measure: area,
+            'materials': {name: fmt(area * amount) for name, amount, fmt in materials}
+        }
         
     except Exception as e:
-        logging.error(f"Material estimation error: {str(e)}")
+        logger.exception("Material estimation error: %s", e)
         return {'error': str(e)}
 
 @app.route('/knowledge-base')
@@ -907,15 +1052,18 @@ def knowledge_base():
 @app.route('/api/knowledge', methods=['POST'])
 def api_knowledge():
     """API endpoint for knowledge base queries"""
+    return knowledge_response(request.get_json())
+
+def knowledge_response(data):
+    """Answer a knowledge base query"""
     try:
-        data = request.get_json()
         query = data.get('query', '').strip()
         
         if not query:
             return jsonify({'error': 'Please enter a query'}), 400
         
         # Get knowledge base response
-        response = civil_ai.get_knowledge_base_response(query)
+        response = get_civil_ai().get_knowledge_base_response(query)
         
         return jsonify({
             'success': True,
@@ -924,9 +1072,23 @@ def api_knowledge():
         })
         
     except Exception as e:
-        logging.error(f"Knowledge base error: {str(e)}")
+        logger.exception("Knowledge base error: %s", e)
         return jsonify({'error': f'Knowledge base error: {str(e)}'}), 500
 
+@app.route('/api/knowledge/stream', methods=['POST'])
+def api_knowledge_stream():
+    """Streaming knowledge base endpoint that sends the answer as Server-Sent Events"""
+    data = request.get_json(silent=True) or request.form
+    query = data.get('query', '').strip()
+    
+    if not query:
+        return jsonify({'error': 'Please enter a query'}), 400
+    
+    if query_too_long(query):
+        return jsonify({'error': 'Query is too long, please shorten it'}), 400
+    
+    return sse_response(get_civil_ai().stream_knowledge_base_response(query))
+
 
 
 @app.route('/plan-reader')
@@ -950,25 +1112,22 @@ def plan_reader_post():
             flash('No file selected', 'warning')
             return redirect(url_for('plan_reader'))
         
-        if file and (allowed_file(file.filename) or file.filename.lower().endswith('.pdf')):
+        if file and (allowed_file(file.filename) or file.filename.lower().endswith('.pdf')) \
+                and upload_starts_with(file, _IMAGE_SIGNATURES + (b'%PDF',)):
             filename = secure_filename(file.filename)
             
-            # Read and encode file
-            file_data = file.read()
-            base64_file = base64.b64encode(file_data).decode('utf-8')
-            
             # Get specific question if provided
             specific_question = request.form.get('plan_question', '').strip()
             
             # Get AI analysis of the building plan
-            analysis = civil_ai.analyze_building_plan(base64_file, filename, specific_question)
+            analysis = get_civil_ai().analyze_building_plan(filename, specific_question)
             
             return render_template('plan_reader.html', analysis=analysis, filename=filename)
         else:
             flash('Invalid file format. Please upload an image file (PNG, JPG, JPEG) or PDF', 'error')
             
     except Exception as e:
-        logging.error(f"Plan analysis error: {str(e)}")
+        logger.exception("Plan analysis error: %s", e)
         flash(f'Plan analysis error: {str(e)}', 'error')
     
     return redirect(url_for('plan_reader'))
@@ -976,68 +1135,119 @@ def plan_reader_post():
 @app.route('/api/steel-weight', methods=['POST'])
 def api_steel_weight():
     """AJAX endpoint for steel weight calculations"""
+    return steel_weight_response(request.get_json(silent=True))
+
+def steel_weight_response(data):
+    """Weights for a steel bar list request"""
     try:
-        data = request.get_json()
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Please send the bars as a JSON object'}), 400
         bars = data.get('bars', [])
         unit = data.get('unit', 'meters')  # meters or feet
         
-        if not bars:
+        if not bars or not isinstance(bars, list):
             return jsonify({'error': 'Please add at least one steel bar'}), 400
         
-        total_weight = 0
-        bar_results = []
+        units = input_units(unit)
+        if units is None:
+            return jsonify({'error': 'Please choose meters or feet'}), 400
+        feet = units['imperial']
+        # Convert length to meters if in feet, folded into one per-bar multiplier
+        length_scale = units['to_m']
         
-        for bar in bars:
-            diameter = float(bar.get('diameter', 0))  # mm
-            length = float(bar.get('length', 0))  # meters or feet
-            quantity = int(bar.get('quantity', 1))
-            
-            if diameter <= 0 or length <= 0 or quantity <= 0:
-                continue
-            
-            # Convert length to meters if in feet
-            if unit == 'feet':
-                length_m = feet_to_meters(length)
-            else:
-                length_m = length
-            
-            # Weight formula: Weight (kg) = (D²/162) × L × Quantity
-            # Where D = diameter in mm, L = length in meters
-            weight_per_bar = (diameter * diameter / 162) * length_m
-            total_bar_weight = weight_per_bar * quantity
-            total_weight += total_bar_weight
-            
+        # Parse every row once and keep only valid bars
+        try:
+            rows = [(float(bar.get('diameter', 0)), float(bar.get('length', 0)), int(bar.get('quantity', 1))) for bar in bars]
+        except (AttributeError, TypeError, ValueError):
+            return jsonify({'error': 'Each bar needs a numeric diameter, length and quantity'}), 400
+        rows = [row for row in rows if row[0] > 0 and row[1] > 0 and row[2] > 0]
+        
+        # Weight formula: Weight (kg) = (D²/162) × L × Quantity, in the compilable kernel
+        # Where D = diameter in mm, L = length in meters
+        diameters, lengths, quantities = zip(*rows) if rows else ((), (), ())
+        weights, totals = bar_weights(list(diameters), list(lengths), list(quantities), length_scale)
+        total_weight = sum(totals)
+        
+        # Weights go out unrounded; the page formats them for display
+        bar_results = []
+        for (diameter, length, quantity), weight_per_bar, total_bar_weight in zip(rows, weights, totals):
             bar_result = {
                 'diameter': diameter,
                 'length': length,
                 'quantity': quantity,
-                'weight_per_bar_kg': round(weight_per_bar, 3),
-                'total_weight_kg': round(total_bar_weight, 3),
+                'weight_per_bar_kg': weight_per_bar,
+                'total_weight_kg': total_bar_weight,
                 'unit': unit
             }
             
             # Add imperial units if needed
-            if unit == 'feet':
-                bar_result['weight_per_bar_lbs'] = round(kg_to_lbs(weight_per_bar), 3)
-                bar_result['total_weight_lbs'] = round(kg_to_lbs(total_bar_weight), 3)
+            if feet:
+                bar_result['weight_per_bar_lbs'] = kg_to_lbs(weight_per_bar)
+                bar_result['total_weight_lbs'] = kg_to_lbs(total_bar_weight)
             
             bar_results.append(bar_result)
         
         results = {
             'bars': bar_results,
-            'total_weight_kg': round(total_weight, 2),
-            'total_bars': sum(bar['quantity'] for bar in bars if bar.get('diameter', 0) > 0)
+            'total_weight_kg': total_weight,
+            'total_bars': sum(quantity for _, _, quantity in rows)
         }
         
-        if unit == 'feet':
-            results['total_weight_lbs'] = round(kg_to_lbs(total_weight), 2)
+        if feet:
+            results['total_weight_lbs'] = kg_to_lbs(total_weight)
         
         return jsonify({'success': True, 'results': results})
         
     except Exception as e:
-        logging.error(f"Steel weight calculation error: {str(e)}")
+        logger.exception("Steel weight calculation error: %s", e)
         return jsonify({'error': f'Calculation error: {str(e)}'}), 500
 
+# JSON endpoints that may be bundled into one /api/batch round trip, as
+# path: (handler taking the JSON body, whether it needs a logged-in user)
+BATCH_HANDLERS = {
+    '/api/concrete-mix': (concrete_mix_response, False),
+    '/api/steel-weight': (steel_weight_response, False),
+    '/api/knowledge': (knowledge_response, False),
+    '/api/chat': (chat_response, True)
+}
+BATCH_MAX_REQUESTS = 10
+
+def _dispatch_batch_item(path, body):
+    """Run one bundled call in the current request and return (status, JSON body)"""
+    handler, needs_login = BATCH_HANDLERS[path]
+    if needs_login and not current_user.is_authenticated:
+        return 401, {'error': 'Please log in to use this endpoint'}
+    response = app.make_response(handler(body))
+    return response.status_code, response.get_json(silent=True)
+
+@app.route('/api/batch', methods=['POST'])
+def api_batch():
+    """Run several JSON API calls in one request
+    
+    Payload: {"requests": [{"path": "/api/concrete-mix", "body": {...}}, ...]}
+    Returns {"success": true, "responses": [{"status": 200, "body": {...}}, ...]} in request order.
+    """
+    data = request.get_json(silent=True)
+    items = data.get('requests') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Please provide a list of requests'}), 400
+    if len(items) > BATCH_MAX_REQUESTS:
+        return jsonify({'error': f'At most {BATCH_MAX_REQUESTS} requests per batch'}), 400
+    
+    for item in items:
+        if not isinstance(item, dict) or item.get('path') not in BATCH_HANDLERS:
+            return jsonify({'error': 'Each request needs a supported path'}), 400
+        if not isinstance(item.get('body') or {}, dict):
+            return jsonify({'error': 'Each request body must be a JSON object'}), 400
+    
+    # Items run in order inside this request, so they see the caller's session and address
+    responses = []
+    for item in items:
+        status, body = _dispatch_batch_item(item['path'], item.get('body') or {})
+        responses.append({'status': status, 'body': body})
+    
+    return jsonify({'success': True, 'responses': responses})
+
 # Error handlers
 @app.errorhandler(404)
 def not_found_error(error):
@@ -1045,5 +1255,5 @@ def not_found_error(error):
 
 @app.errorhandler(500)
 def internal_error(error):
-    logging.error(f"Internal server error: {str(error)}")
+    logger.error("Internal server error: %s", error)
     return render_template('500.html'), 500